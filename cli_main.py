@@ -9,25 +9,58 @@
 import os
 import argparse
 import sys
-from image_processor import ImageProcessor
+from image_processor import ImageProcessor, SUPPORTED_FORMATS, find_image_files
 from sensitive_info_detector import SensitiveInfoDetector
 import concurrent.futures
+import gc
 import time
 
-def process_file(file_path, image_processor, detector, selected_types, verbose=False):
+# 支持的图像格式（小写扩展名）
+_EXT_SET = frozenset(SUPPORTED_FORMATS)
+
+# 工作进程每处理多少个文件执行一次完整的垃圾回收
+_GC_INTERVAL = 100
+
+# 批量模式下每次调用Tesseract识别的最大图像数，列表过长时Tesseract可能长时间无响应
+_BATCH_SIZE = 50
+
+# 工作进程内的图像处理器，由_worker_init在每个进程中创建一次。
+# 其初始化开销较大（OCR引擎），必须在进程内的所有文件之间共享，不能按文件创建。
+# 工作进程只负责OCR，敏感信息检测在主进程中随结果到达进行，与其他文件的OCR重叠
+_image_processor = None
+
+# 工作进程已处理的文件数
+_processed_count = 0
+
+def _worker_init():
     """
-    处理单个文件
+    工作进程初始化函数，创建进程内共享的图像处理器
+    """
+    global _image_processor
+    if _image_processor is None:
+        _image_processor = ImageProcessor()
+
+def process_file(file_path, verbose=False):
+    """
+    提取单个文件中的文本（在工作进程中执行）
     
     参数:
         file_path (str): 文件路径
-        image_processor (ImageProcessor): 图像处理器
-        detector (SensitiveInfoDetector): 敏感信息检测器
-        selected_types (list): 要检测的敏感信息类型
         verbose (bool): 是否显示详细信息
         
     返回:
-        dict: 检测结果
+        dict: 处理结果，成功时包含提取的文本
     """
+    global _processed_count
+    
+    # 调试模式下确认工作进程已初始化，处理器不会在这里被重复创建
+    assert _image_processor is not None, "工作进程未通过_worker_init初始化"
+    
+    # 对象通常在引用计数归零时即被释放，这里只偶尔做一次完整回收，清理可能存在的循环引用
+    _processed_count += 1
+    if _processed_count % _GC_INTERVAL == 0:
+        gc.collect()
+    
     try:
         if verbose:
             print(f"正在处理: {file_path}")
@@ -40,20 +73,16 @@ def process_file(file_path, image_processor, detector, selected_types, verbose=F
             raise PermissionError(f"没有读取文件的权限: {file_path}")
             
         # 检查文件扩展名
-        _, ext = os.path.splitext(file_path.lower())
-        supported_formats = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif')
-        if ext not in supported_formats:
+        ext = os.path.splitext(file_path)[1].lower()
+        if ext not in _EXT_SET:
             raise ValueError(f"不支持的文件格式: {ext}")
         
         # 提取文本
-        text = image_processor.process_image(file_path)
-        
-        # 检测敏感信息
-        results = detector.detect_sensitive_info(text, selected_types)
+        text = _image_processor.process_image(file_path)
         
         return {
             'file': file_path,
-            'results': results,
+            'text': text,
             'success': True
         }
     except Exception as e:
@@ -64,6 +93,47 @@ def process_file(file_path, image_processor, detector, selected_types, verbose=F
             'success': False
         }
 
+def process_batch(file_paths, verbose=False):
+    """
+    批量提取一组文件中的文本（在工作进程中执行），所有文件只启动一次Tesseract
+    
+    批量识别失败时（如某个文件无法读取），改为逐个处理这组文件，
+    以便为每个文件给出各自的结果或错误信息
+    
+    参数:
+        file_paths (list): 文件路径列表
+        verbose (bool): 是否显示详细信息
+        
+    返回:
+        list: 处理结果，与file_paths一一对应
+    """
+    global _processed_count
+    
+    assert _image_processor is not None, "工作进程未通过_worker_init初始化"
+    
+    try:
+        if verbose:
+            for file_path in file_paths:
+                print(f"正在处理: {file_path}")
+        
+        texts = _image_processor.process_images(file_paths)
+    except Exception as e:
+        print(f"批量处理出错，改为逐个处理: {str(e)}")
+        return [process_file(file_path, verbose) for file_path in file_paths]
+    
+    _processed_count += len(file_paths)
+    if _processed_count % _GC_INTERVAL < len(file_paths):
+        gc.collect()
+    
+    return [
+        {
+            'file': file_path,
+            'text': text,
+            'success': True
+        }
+        for file_path, text in zip(file_paths, texts)
+    ]
+
 def main():
     """
     命令行主函数
@@ -81,11 +151,12 @@ def main():
     parser.add_argument('-o', '--output', help='输出结果文件路径')
     parser.add_argument('-v', '--verbose', action='store_true', help='显示详细信息')
     parser.add_argument('-j', '--jobs', type=int, default=4, help='并行处理的任务数（默认为4）')
+    parser.add_argument('--batch', action='store_true',
+                        help=f'批量模式：每{_BATCH_SIZE}个文件只调用一次tesseract命令行（未安装tesserocr时可减少启动开销）')
     
     args = parser.parse_args()
     
-    # 初始化图像处理器和敏感信息检测器
-    image_processor = ImageProcessor()
+    # 初始化敏感信息检测器（图像处理和OCR在工作进程中完成，检测在主进程中进行）
     detector = SensitiveInfoDetector()
     
     # 获取所有可用的敏感信息类型
@@ -121,15 +192,8 @@ def main():
             print(f"错误: 文件夹不存在: {args.directory}")
             sys.exit(1)
         
-        # 支持的图像格式
-        image_extensions = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif')
-        
-        # 遍历文件夹中的所有文件
-        for root, _, files in os.walk(args.directory):
-            for file in files:
-                if file.lower().endswith(image_extensions):
-                    file_path = os.path.join(root, file)
-                    files_to_scan.append(file_path)
+        # 遍历文件夹中的所有图像文件
+        files_to_scan.extend(find_image_files(args.directory))
     
     if not files_to_scan:
         print("错误: 没有找到要扫描的图像文件")
@@ -138,29 +202,50 @@ def main():
     print(f"开始扫描 {len(files_to_scan)} 个图像文件...")
     start_time = time.time()
     
-    # 使用线程池并行处理文件
+    # 使用进程池并行处理文件，每个工作进程只初始化一次图像处理器和检测器
     results = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=args.jobs) as executor:
-        # 提交所有任务
-        future_to_file = {
-            executor.submit(
-                process_file, file, image_processor, detector, selected_types, args.verbose
-            ): file for file in files_to_scan
-        }
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs, initializer=_worker_init) as executor:
+        # 提交所有任务，批量模式下每个任务处理一组文件
+        if args.batch:
+            future_to_files = {
+                executor.submit(
+                    process_batch, files_to_scan[i:i + _BATCH_SIZE], args.verbose
+                ): files_to_scan[i:i + _BATCH_SIZE] for i in range(0, len(files_to_scan), _BATCH_SIZE)
+            }
+        else:
+            future_to_files = {
+                executor.submit(
+                    process_file, file, args.verbose
+                ): [file] for file in files_to_scan
+            }
         
-        # 处理结果
-        for i, future in enumerate(concurrent.futures.as_completed(future_to_file), 1):
-            file = future_to_file[future]
+        # 按完成顺序处理结果
+        i = 0
+        for future in concurrent.futures.as_completed(future_to_files):
+            files = future_to_files[future]
             try:
-                result = future.result()
+                file_results = future.result()
+            except Exception as e:
+                for file in files:
+                    print(f"处理文件时出错: {file}, 错误: {str(e)}")
+                i += len(files)
+                continue
+            
+            if not args.batch:
+                file_results = [file_results]
+            
+            for file, result in zip(files, file_results):
+                i += 1
+                
+                # 在主进程中检测敏感信息，此时工作进程已经开始识别后续文件
+                if result['success']:
+                    result['results'] = detector.detect_sensitive_info(result.pop('text'), selected_types)
                 results.append(result)
                 
                 if not args.verbose:
                     print(f"[{i}/{len(files_to_scan)}] 正在处理: {os.path.basename(file)}")
                     if not result['success']:
                         print(f"处理图像时出错: {result.get('error', '未知错误')}")
-            except Exception as e:
-                print(f"处理文件时出错: {file}, 错误: {str(e)}")
     
     # 统计结果
     successful_results = [r for r in results if r['success']]
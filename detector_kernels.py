@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+检测校验内核模块 (detector_kernels.py)
+该模块提供敏感信息检测中逐位计算的校验函数。
+安装了numba时编译为本地代码执行，否则使用等价的纯Python实现。
+"""
+
+import numpy as np
+
+# numba为可选依赖：安装后校验循环由LLVM编译为本地代码，并在执行时释放GIL
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# Luhn算法中数字乘以2后的各位数字之和
+_LUHN_DOUBLED = (0, 2, 4, 6, 8, 1, 3, 5, 7, 9)
+_LUHN_DOUBLED_ARRAY = np.array(_LUHN_DOUBLED, dtype=np.uint8)
+
+def _luhn_checksum(digits, doubled):
+    """
+    计算Luhn校验和（编译内核）
+    
+    参数:
+        digits (numpy.ndarray): 卡号的ASCII编码（uint8数组，只包含'0'-'9'）
+        doubled (numpy.ndarray): 数字乘以2后的各位数字之和查找表
+        
+    返回:
+        int: 校验和，能被10整除时卡号有效
+    """
+    total = 0
+    n = digits.shape[0]
+    for i in range(n):
+        digit = digits[n - 1 - i] - 48
+        if i % 2 == 0:
+            total += digit
+        else:
+            total += doubled[digit]
+    return total
+
+if numba is not None:
+    _luhn_checksum = numba.njit(cache=True, nogil=True)(_luhn_checksum)
+
+def luhn_valid(card):
+    """
+    使用Luhn算法验证卡号：从右向左，偶数位（从0开始）直接相加，
+    奇数位乘以2后取各位数字之和（查表得到，例如8*2=16对应1+6=7）
+    
+    参数:
+        card (str): 只包含十进制数字的卡号
+        
+    返回:
+        bool: 校验和是否能被10整除
+    """
+    if numba is not None and card.isascii():
+        # 直接在卡号的ASCII字节上运行编译内核
+        return _luhn_checksum(np.frombuffer(card.encode('ascii'), dtype=np.uint8), _LUHN_DOUBLED_ARRAY) % 10 == 0
+    
+    checksum = sum(int(d) for d in card[-1::-2]) + sum(_LUHN_DOUBLED[int(d)] for d in card[-2::-2])
+    return checksum % 10 == 0
@@ -6,14 +6,72 @@
 该模块负责图像的加载、预处理和OCR文本提取。
 """
 
+import io
 import os
+import queue
+import subprocess
+import tempfile
+import threading
 import numpy as np
 from PIL import Image
 import pytesseract
 import cv2
-import gc
 import platform
 
+# tesserocr为可选依赖：安装后在进程内复用Tesseract引擎，
+# 避免pytesseract每次识别都启动子进程并重新加载语言数据。
+# 每个引擎实例只使用单个OpenMP线程，避免多个引擎并行时互相争抢CPU（必须在导入tesserocr之前设置）；
+# 未安装时撤销该设置，pytesseract和批量模式启动的tesseract子进程仍使用多线程
+_set_omp_thread_limit = 'OMP_THREAD_LIMIT' not in os.environ
+if _set_omp_thread_limit:
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+    if _set_omp_thread_limit:
+        del os.environ['OMP_THREAD_LIMIT']
+
+# 支持的图像格式（小写扩展名）
+SUPPORTED_FORMATS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif')
+
+def find_image_files(directory):
+    """
+    递归查找文件夹中的所有图像文件，顺序与os.walk相同
+    
+    使用os.scandir遍历，文件类型直接取自目录项，不需要对每个文件额外调用stat
+    
+    参数:
+        directory (str): 文件夹路径
+        
+    返回:
+        list: 图像文件路径列表
+    """
+    image_files = []
+    stack = [directory]
+    
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            # 与os.walk一致，跳过无法读取的文件夹
+            continue
+        
+        subdirs = []
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    # 与os.walk一致，不进入指向文件夹的符号链接
+                    subdirs.append(entry.path)
+                elif entry.name.lower().endswith(SUPPORTED_FORMATS) and entry.is_file():
+                    # 只有符号链接需要额外stat，普通文件直接使用目录项中的类型
+                    image_files.append(entry.path)
+        
+        # 子文件夹逆序入栈，保持与os.walk相同的顺序
+        stack.extend(reversed(subdirs))
+    
+    return image_files
+
 # 根据操作系统设置Tesseract路径
 #if platform.system() == 'Windows':
     #pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
@@ -24,12 +82,15 @@ class ImageProcessor:
     图像处理类，负责图像的加载、预处理和OCR文本提取
     """
     
-    def __init__(self):
+    def __init__(self, ocr_workers=1):
         """
         初始化图像处理器
+        
+        参数:
+            ocr_workers (int): OCR引擎池大小，即可同时进行OCR识别的线程数（仅在安装了tesserocr时生效）
         """
         # 支持的图像格式
-        self.supported_formats = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif')
+        self.supported_formats = SUPPORTED_FORMATS
         
         # OCR语言设置（默认使用英文和简体中文）
         self.ocr_lang = 'eng+chi_sim'
@@ -48,6 +109,59 @@ class ImageProcessor:
         
         # 性能优化参数
         self.max_image_dimension = 1800  # 最大图像尺寸，超过此尺寸将被缩放
+        
+        # 每个线程各自的预处理缓冲区，按需增长后在后续图像之间复用
+        self._scratch = threading.local()
+        
+        # OCR引擎池，每个引擎实例只加载一次语言数据，识别时释放GIL，可被多个线程共享
+        self._api_pool = None
+        if tesserocr is not None:
+            self._api_pool = queue.Queue()
+            for _ in range(max(1, ocr_workers)):
+                self._api_pool.put(tesserocr.PyTessBaseAPI(lang=self.ocr_lang, psm=tesserocr.PSM.AUTO))
+    
+    def close(self):
+        """
+        释放OCR引擎池中的所有引擎
+        """
+        if self._api_pool is None:
+            return
+        
+        while True:
+            try:
+                api = self._api_pool.get_nowait()
+            except queue.Empty:
+                break
+            api.End()
+        self._api_pool = None
+    
+    def __del__(self):
+        """析构时释放OCR引擎"""
+        try:
+            self.close()
+        except Exception:
+            pass
+    
+    def _scratch_buffer(self, name, shape):
+        """
+        获取当前线程可复用的uint8缓冲区，作为OpenCV函数的dst参数
+        
+        缓冲区只在容量不足时重新分配，返回其前部按shape组织的视图。
+        注意：同一线程处理下一张图像时会覆盖其中的内容
+        
+        参数:
+            name (str): 缓冲区名称，不同的处理步骤使用不同的缓冲区
+            shape (tuple): 需要的数组形状
+            
+        返回:
+            numpy.ndarray: 形状为shape的uint8数组（内容未初始化）
+        """
+        size = int(np.prod(shape))
+        buffer = getattr(self._scratch, name, None)
+        if buffer is None or buffer.size < size:
+            buffer = np.empty(size, dtype=np.uint8)
+            setattr(self._scratch, name, buffer)
+        return buffer[:size].reshape(shape)
     
     def load_image(self, image_path):
         """
@@ -59,6 +173,53 @@ class ImageProcessor:
         返回:
             numpy.ndarray: 加载的图像
         """
+        self.check_image_path(image_path)
+        
+        try:
+            # 使用PIL/Pillow加载图像，load()会完整解码图像，损坏的文件在此处抛出异常
+            with Image.open(image_path) as pil_image:
+                pil_image.load()
+                
+                # 转换为NumPy数组（保持Pillow的RGB通道顺序，由_preprocess_for_ocr统一转换）
+                image = np.asarray(pil_image)
+                
+            return image
+        except Exception as e:
+            raise IOError(f"无法加载图像: {image_path}, 错误: {str(e)}")
+    
+    def load_gray_image(self, image_path):
+        """
+        以灰度模式加载图像文件
+        
+        由解码库直接输出单通道图像（JPEG解码时只解码亮度分量），
+        省去彩色解码和之后的灰度转换
+        
+        参数:
+            image_path (str): 图像文件路径
+            
+        返回:
+            numpy.ndarray: 加载的灰度图像
+        """
+        self.check_image_path(image_path)
+        
+        try:
+            # 先读取文件内容再解码，cv2.imread无法打开Windows上包含中文的路径
+            image = cv2.imdecode(np.fromfile(image_path, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        except Exception as e:
+            raise IOError(f"无法加载图像: {image_path}, 错误: {str(e)}")
+        
+        if image is None:
+            raise IOError(f"无法加载图像: {image_path}, 错误: 无法解码图像数据")
+        
+        return image
+    
+    def check_image_path(self, image_path):
+        """
+        检查图像文件是否存在且格式受支持
+        
+        参数:
+            image_path (str): 图像文件路径
+        """
         # 检查文件是否存在
         if not os.path.exists(image_path):
             raise FileNotFoundError(f"图像文件不存在: {image_path}")
@@ -67,52 +228,60 @@ class ImageProcessor:
         _, ext = os.path.splitext(image_path.lower())
         if ext not in self.supported_formats:
             raise ValueError(f"不支持的图像格式: {ext}，支持的格式有: {', '.join(self.supported_formats)}")
+    
+    def _preprocess_for_ocr(self, image, grayscale=True):
+        """
+        为OCR优化图像大小和格式
         
-        try:
-            # 使用PIL/Pillow加载图像
-            pil_image = Image.open(image_path)
-            
-            # 检查图像是否有效
-            pil_image.verify()  # 添加这行以验证图像是否有效
-            
-            # 重新打开图像（verify后需要重新打开）
-            pil_image = Image.open(image_path)
-            
-            # 转换为NumPy数组（OpenCV格式）
-            image = np.array(pil_image)
+        先转换通道再缩放，需要灰度图时直接从RGB转换为单通道，
+        缩放只处理单通道数据，减少内存读写量
+        
+        参数:
+            image (numpy.ndarray): load_image返回的RGB/RGBA/灰度图像
+            grayscale (bool): 是否转换为灰度图，否则转换为3通道RGB图像
             
-            # 如果图像是RGB格式，转换为BGR（OpenCV使用BGR）
-            if len(image.shape) == 3 and image.shape[2] == 3:
-                image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-                
-            return image
-        except Exception as e:
-            raise IOError(f"无法加载图像: {image_path}, 错误: {str(e)}")
-    
-    def _preprocess_for_ocr(self, image):
-        """为OCR优化图像大小和格式"""
+        返回:
+            numpy.ndarray: 处理后的图像
+        """
         # 处理图像通道问题
-        if len(image.shape) == 2:
-            # 单通道图像（灰度），转换为3通道
-            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
-        elif len(image.shape) == 3 and image.shape[2] == 4:
-            # 4通道图像（RGBA），转换为3通道
-            image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
-        elif len(image.shape) == 3 and image.shape[2] == 2:
-            # 2通道图像，转换为3通道
-            # 创建一个3通道图像
-            height, width = image.shape[:2]
-            bgr_image = np.zeros((height, width, 3), dtype=np.uint8)
-            # 复制前两个通道到BGR图像
-            bgr_image[:, :, 0] = image[:, :, 0]
-            bgr_image[:, :, 1] = image[:, :, 1]
-            image = bgr_image
+        if grayscale:
+            if len(image.shape) == 3 and image.shape[2] == 3:
+                image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY, dst=self._scratch_buffer('converted', image.shape[:2]))
+            elif len(image.shape) == 3 and image.shape[2] == 4:
+                # 4通道图像（RGBA），忽略透明通道
+                image = cv2.cvtColor(image, cv2.COLOR_RGBA2GRAY, dst=self._scratch_buffer('converted', image.shape[:2]))
+            elif len(image.shape) == 3 and image.shape[2] == 2:
+                # 2通道图像（灰度+透明度），取灰度通道
+                image = np.ascontiguousarray(image[:, :, 0])
+        else:
+            if len(image.shape) == 2:
+                # 单通道图像（灰度），转换为3通道
+                image = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB, dst=self._scratch_buffer('converted', image.shape + (3,)))
+            elif len(image.shape) == 3 and image.shape[2] == 4:
+                # 4通道图像（RGBA），转换为3通道
+                image = cv2.cvtColor(image, cv2.COLOR_RGBA2RGB, dst=self._scratch_buffer('converted', image.shape[:2] + (3,)))
+            elif len(image.shape) == 3 and image.shape[2] == 2:
+                # 2通道图像（灰度+透明度），用灰度通道生成3通道图像
+                image = cv2.cvtColor(
+                    np.ascontiguousarray(image[:, :, 0]), cv2.COLOR_GRAY2RGB,
+                    dst=self._scratch_buffer('converted', image.shape[:2] + (3,))
+                )
         
         # 缩放大图像以提高处理速度
         h, w = image.shape[:2]
         if max(h, w) > self.max_image_dimension:
             scale = self.max_image_dimension / max(h, w)
-            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            size = (round(w * scale), round(h * scale))
+            image = cv2.resize(
+                image, size, dst=self._scratch_buffer('resized', (size[1], size[0]) + image.shape[2:]),
+                interpolation=cv2.INTER_AREA
+            )
+        
+        # 灰度图上的预处理方法会就地修改图像，load_image返回的只读数组需要先复制到缓冲区
+        if grayscale and not image.flags.writeable:
+            buffer = self._scratch_buffer('converted', image.shape)
+            np.copyto(buffer, image)
+            image = buffer
         
         return image
     
@@ -128,75 +297,212 @@ class ImageProcessor:
             str: 提取的文本
         """
         try:
-            # 加载图像
-            image = self.load_image(image_path)
+            image = self._prepare_image(image_path, preprocessing_methods)
+            
+            # 使用OCR提取文本
+            return self._extract_text(image)
+        except Exception as e:
+            raise Exception(f"处理图像时出错: {str(e)}")
+    
+    def process_images(self, image_paths, preprocessing_methods=None):
+        """
+        批量处理图像并提取文本，所有图像只启动一次Tesseract
+        
+        预处理后的图像写入临时文件夹，再通过图像列表文件交给tesseract命令行一次识别，
+        省去每张图像启动一次Tesseract进程并重新加载语言数据的开销。
+        列表过长时Tesseract可能长时间无响应，图像较多时应分批调用
+        
+        参数:
+            image_paths (list): 图像文件路径列表
+            preprocessing_methods (list, optional): 要应用的预处理方法列表
             
-            # 为OCR优化图像大小
-            image = self._preprocess_for_ocr(image)
+        返回:
+            list: 提取的文本，与image_paths一一对应
+        """
+        if not image_paths:
+            return []
+        
+        try:
+            with tempfile.TemporaryDirectory() as temp_dir:
+                temp_paths = []
+                for index, image_path in enumerate(image_paths):
+                    image = self._prepare_image(image_path, preprocessing_methods)
+                    
+                    # 图像位于复用的缓冲区中，处理下一张之前先写入文件（只做最低程度的压缩）
+                    temp_path = os.path.join(temp_dir, f"{index}.png")
+                    Image.fromarray(image).save(temp_path, compress_level=1)
+                    temp_paths.append(temp_path)
+                
+                list_path = os.path.join(temp_dir, 'images.txt')
+                with open(list_path, 'w', encoding='utf-8') as f:
+                    f.write("\n".join(temp_paths) + "\n")
+                
+                completed = subprocess.run(
+                    [pytesseract.pytesseract.tesseract_cmd, list_path, 'stdout', '-l', self.ocr_lang],
+                    stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
+                )
+        except subprocess.CalledProcessError as e:
+            raise Exception(f"批量OCR识别失败: {e.stderr.decode('utf-8', 'replace').strip()}")
+        except Exception as e:
+            raise Exception(f"批量处理图像时出错: {str(e)}")
+        
+        # Tesseract在每张图像的文本之后输出一个换页符
+        pages = completed.stdout.decode('utf-8').split('\f')
+        if len(pages) != len(image_paths) + 1:
+            raise Exception(f"批量OCR识别结果数量不匹配: 需要{len(image_paths)}项，得到{len(pages) - 1}项")
+        
+        return pages[:-1]
+    
+    def process_image_buffer(self, buffer, preprocessing_methods=None):
+        """
+        处理内存中的图像文件数据并提取文本
+        
+        数据可以是bytes或mmap等支持缓冲区协议的对象，需要灰度图时直接在其上解码，
+        不会再复制一份文件内容（传入mmap时由系统页缓存提供数据）
+        
+        参数:
+            buffer (bytes-like): 图像文件的完整内容
+            preprocessing_methods (list, optional): 要应用的预处理方法列表
             
-            # 如果未指定预处理方法，则使用默认方法
+        返回:
+            str: 提取的文本
+        """
+        try:
             if preprocessing_methods is None:
                 preprocessing_methods = self.default_preprocessing
             
-            # 应用预处理方法
-            for method in preprocessing_methods:
-                if method in self.preprocessing_methods:
-                    image = self.preprocessing_methods[method](image)
+            grayscale = self._uses_grayscale(preprocessing_methods)
+            image = self.decode_image(buffer, grayscale)
+            image = self._apply_preprocessing(image, grayscale, preprocessing_methods)
             
             # 使用OCR提取文本
-            text = self._extract_text(image)
-            
-            # 主动释放内存
-            del image
-            gc.collect()
-            
-            return text
+            return self._extract_text(image)
         except Exception as e:
             raise Exception(f"处理图像时出错: {str(e)}")
     
+    def decode_image(self, buffer, grayscale=True):
+        """
+        从内存中的图像文件数据解码图像
+        
+        参数:
+            buffer (bytes-like): 图像文件的完整内容
+            grayscale (bool): 是否直接解码为灰度图，否则使用Pillow解码（与load_image相同）
+            
+        返回:
+            numpy.ndarray: 解码后的图像
+        """
+        try:
+            if grayscale:
+                # np.frombuffer直接引用原数据，不复制
+                image = cv2.imdecode(np.frombuffer(buffer, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+            else:
+                with Image.open(io.BytesIO(buffer)) as pil_image:
+                    pil_image.load()
+                    image = np.asarray(pil_image)
+        except Exception as e:
+            raise IOError(f"无法解码图像: {str(e)}")
+        
+        if image is None:
+            raise IOError("无法解码图像: 无法解码图像数据")
+        
+        return image
+    
+    def _prepare_image(self, image_path, preprocessing_methods=None):
+        """
+        加载图像并完成OCR前的全部预处理
+        
+        参数:
+            image_path (str): 图像文件路径
+            preprocessing_methods (list, optional): 要应用的预处理方法列表
+            
+        返回:
+            numpy.ndarray: 预处理后的图像（位于当前线程复用的缓冲区中）
+        """
+        # 如果未指定预处理方法，则使用默认方法
+        if preprocessing_methods is None:
+            preprocessing_methods = self.default_preprocessing
+        
+        grayscale = self._uses_grayscale(preprocessing_methods)
+        
+        # 加载图像，需要灰度图时直接以灰度模式解码，只有保留彩色时才使用Pillow加载
+        if grayscale:
+            image = self.load_gray_image(image_path)
+        else:
+            image = self.load_image(image_path)
+        
+        return self._apply_preprocessing(image, grayscale, preprocessing_methods)
+    
+    def _uses_grayscale(self, preprocessing_methods):
+        """
+        判断预处理是否在灰度图上进行（除'none'外的预处理方法都在灰度图上进行）
+        
+        参数:
+            preprocessing_methods (list): 要应用的预处理方法列表
+            
+        返回:
+            bool: 是否需要灰度图
+        """
+        return any(
+            method != 'none' and method in self.preprocessing_methods
+            for method in preprocessing_methods
+        )
+    
+    def _apply_preprocessing(self, image, grayscale, preprocessing_methods):
+        """
+        对加载后的图像完成OCR前的全部预处理
+        
+        参数:
+            image (numpy.ndarray): 加载的图像
+            grayscale (bool): 是否转换为灰度图
+            preprocessing_methods (list): 要应用的预处理方法列表
+            
+        返回:
+            numpy.ndarray: 预处理后的图像（位于当前线程复用的缓冲区中）
+        """
+        # 为OCR优化图像大小和格式
+        image = self._preprocess_for_ocr(image, grayscale)
+        
+        # 应用预处理方法
+        for method in preprocessing_methods:
+            if method in self.preprocessing_methods:
+                image = self.preprocessing_methods[method](image)
+        
+        return image
+    
     def _no_preprocessing(self, image):
         """不进行预处理，直接返回原始图像"""
         return image
     
     def _grayscale(self, image):
-        """将图像转换为灰度图"""
+        """将图像转换为灰度图（_preprocess_for_ocr通常已完成转换）"""
         if len(image.shape) == 3:
-            return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            return cv2.cvtColor(image, cv2.COLOR_RGB2GRAY, dst=self._scratch_buffer('gray', image.shape[:2]))
         return image
     
     def _binarization(self, image):
-        """将图像二值化"""
-        # 确保图像是灰度图
-        if len(image.shape) == 3:
-            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        # 应用自适应阈值二值化
+        """将灰度图像二值化（就地修改输入图像）"""
+        # 应用自适应阈值二值化，结果直接写回输入图像
         return cv2.adaptiveThreshold(
             image, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-            cv2.THRESH_BINARY, 11, 2
+            cv2.THRESH_BINARY, 11, 2,
+            dst=image
         )
     
     def _noise_removal(self, image):
-        """去除图像噪点"""
-        # 确保图像是灰度图
-        if len(image.shape) == 3:
-            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        # 应用中值滤波去噪
-        return cv2.medianBlur(image, 3)
+        """去除灰度图像噪点（就地修改输入图像）"""
+        # 应用中值滤波去噪，结果直接写回输入图像
+        return cv2.medianBlur(image, 3, dst=image)
     
     def _deskew(self, image):
-        """校正图像倾斜"""
-        # 确保图像是灰度图
-        if len(image.shape) == 3:
-            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
+        """校正灰度图像倾斜"""
         # 计算图像的倾斜角度
-        coords = np.column_stack(np.where(image > 0))
-        if len(coords) <= 10:  # 如果有效像素太少，跳过校正
+        coords = cv2.findNonZero(image)
+        if coords is None or len(coords) <= 10:  # 如果有效像素太少，跳过校正
             return image
             
         try:
+            # findNonZero返回(x, y)坐标，交换为(行, 列)以保持下面的角度换算不变
+            coords = np.ascontiguousarray(coords.reshape(-1, 2)[:, ::-1])
             angle = cv2.minAreaRect(coords)[-1]
             
             # 如果角度小于-45度，加上90度
@@ -211,6 +517,7 @@ class ImageProcessor:
             M = cv2.getRotationMatrix2D(center, angle, 1.0)
             rotated = cv2.warpAffine(
                 image, M, (w, h), 
+                dst=self._scratch_buffer('deskewed', image.shape),
                 flags=cv2.INTER_CUBIC, 
                 borderMode=cv2.BORDER_REPLICATE
             )
@@ -230,22 +537,26 @@ class ImageProcessor:
         返回:
             str: 提取的文本
         """
-        # 将OpenCV图像转换为PIL图像
-        if len(image.shape) == 3:
-            # 彩色图像，BGR转RGB
-            pil_image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-        else:
-            # 灰度图像
-            pil_image = Image.fromarray(image)
-        
-        # 使用Tesseract OCR提取文本
+        # 使用Tesseract OCR提取文本（图像为灰度或RGB通道顺序，直接交给Tesseract，不再构造PIL图像）
+        api = None
         try:
-            text = pytesseract.image_to_string(pil_image, lang=self.ocr_lang)
+            if self._api_pool is not None:
+                # 从引擎池中取出一个空闲引擎，直接传入像素数据，在进程内完成识别
+                api = self._api_pool.get()
+                image = np.ascontiguousarray(image)
+                height, width = image.shape[:2]
+                bytes_per_pixel = 1 if image.ndim == 2 else image.shape[2]
+                api.SetImageBytes(image.tobytes(), width, height, bytes_per_pixel, width * bytes_per_pixel)
+                text = api.GetUTF8Text()
+            else:
+                # pytesseract可以直接接收NumPy数组
+                text = pytesseract.image_to_string(image, lang=self.ocr_lang)
         except Exception as e:
             raise Exception(f"OCR文本提取失败: {str(e)}")
         finally:
-            # 释放PIL图像内存
-            del pil_image
+            # 将引擎归还到池中
+            if api is not None:
+                self._api_pool.put(api)
         
         return text
 
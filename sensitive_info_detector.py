@@ -7,8 +7,40 @@
 增加了更精确的正则表达式和上下文验证以减少误报。
 """
 
+import functools
 import re
+import threading
+from array import array
 from collections import defaultdict
+from detector_kernels import luhn_valid
+
+# hyperscan为可选依赖：安装后先用一次多模式扫描筛掉文本中肯定不会出现的类型
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+# Hyperscan预筛选表达式的编译选项
+if hyperscan is not None:
+    _HYPERSCAN_FLAGS = (hyperscan.HS_FLAG_PREFILTER | hyperscan.HS_FLAG_SINGLEMATCH |
+                        hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP)
+
+# pyahocorasick为可选依赖：安装后地址检测先一次性查找城市名，只在命中处匹配地址
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# 地址必须以这些城市名开头
+_ADDRESS_CITIES = (
+    '北京', '上海', '天津', '重庆', '广州', '深圳', '杭州', '南京', '武汉', '成都',
+    '西安', '沈阳', '大连', '青岛', '济南', '郑州', '长沙', '福州', '厦门', '哈尔滨',
+    '长春', '太原', '石家庄', '呼和浩特', '南宁', '银川', '乌鲁木齐', '拉萨', '西宁', '兰州',
+    '贵阳', '昆明', '南昌', '合肥', '海口', '三亚', '香港', '澳门', '台北'
+)
+
+# 城市名之后的地址部分：区县、路街道、门牌号等
+_ADDRESS_TAIL = r'(?:市|省|特别行政区)?[\u4e00-\u9fa5]{1,3}(?:区|县|市)[\u4e00-\u9fa5]{2,10}(?:路|街|道|巷|胡同)[\u4e00-\u9fa5\d]{1,10}号?(?:[\u4e00-\u9fa5\d]{1,10}(?:号楼|单元|室|号))?'
 
 class SensitiveInfoDetector:
     """
@@ -41,7 +73,7 @@ class SensitiveInfoDetector:
             },
             'address': {
                 'name': '家庭住址',
-                'pattern': r'(?:北京|上海|天津|重庆|广州|深圳|杭州|南京|武汉|成都|西安|沈阳|大连|青岛|济南|郑州|长沙|福州|厦门|哈尔滨|长春|太原|石家庄|呼和浩特|南宁|银川|乌鲁木齐|拉萨|西宁|兰州|贵阳|昆明|南昌|合肥|海口|三亚|香港|澳门|台北)(?:市|省|特别行政区)?[\u4e00-\u9fa5]{1,3}(?:区|县|市)[\u4e00-\u9fa5]{2,10}(?:路|街|道|巷|胡同)[\u4e00-\u9fa5\d]{1,10}号?(?:[\u4e00-\u9fa5\d]{1,10}(?:号楼|单元|室|号))?',
+                'pattern': '(?:' + '|'.join(_ADDRESS_CITIES) + ')' + _ADDRESS_TAIL,
                 'description': '包含省市区县、路街道等信息的地址',
                 'validator': self._validate_address
             },
@@ -76,8 +108,203 @@ class SensitiveInfoDetector:
         
         # 设置最小置信度阈值（0-100）
         self.confidence_threshold = 50  # 降低阈值使检测更宽松
+        
+        # 预编译各类型的匹配模式，避免每次检测时重复编译
+        self._compiled = {
+            type_id: re.compile(info['pattern'], re.IGNORECASE)
+            for type_id, info in self.patterns.items()
+        }
+        
+        # 安装了pyahocorasick时，用城市名自动机一次扫描找出地址可能的起点
+        if ahocorasick is not None:
+            self._city_automaton = ahocorasick.Automaton()
+            for city in _ADDRESS_CITIES:
+                self._city_automaton.add_word(city, len(city))
+            self._city_automaton.make_automaton()
+        else:
+            self._city_automaton = None
+        
+        # 按类型组合缓存的Hyperscan预筛选数据库
+        self._hyperscan_prefilters = {}
+        
+        # Hyperscan的scratch空间不能被多个线程同时使用，每个线程各自分配一份
+        self._hyperscan_local = threading.local()
+        
+        # 各类型出现在文本中的必要条件，未安装hyperscan时用于快速预筛选
+        digit_regex = re.compile(r'\d')
+        self._required_regex = {
+            'phone': digit_regex,
+            'landline': digit_regex,
+            'id_card': digit_regex,
+            'credit_card': digit_regex,
+            'ip_address': digit_regex,
+            'email': re.compile('@'),
+            'password': re.compile(r'密码|password|pwd', re.IGNORECASE)
+        }
+        
+        # 预编译验证时使用的上下文关键词模式
+        self._context_regex = {
+            'phone': re.compile(r'(手机|电话|联系|拨打|号码)'),
+            'landline': re.compile(r'(电话|座机|分机|传真|客服)'),
+            'id_card': re.compile(r'(身份证|证件|号码|身份|证号)'),
+            'address': re.compile(r'(地址|住址|家庭|位于|住在)'),
+            'email': re.compile(r'(邮箱|邮件|电子邮件|Email|联系)'),
+            'password': re.compile(r'(密码|口令|password|pwd)'),
+            'credit_card': re.compile(r'(银行卡|信用卡|储蓄卡|卡号|账号)'),
+            'ip_address': re.compile(r'(IP|地址|服务器|网络|主机)')
+        }
+        
+        # 预编译验证时使用的格式校验模式
+        self._format_regex = {
+            'phone': re.compile(r'^1[3-9]\d{9}$'),
+            'landline': re.compile(r'^(?:0\d{2,3}[-\s])?[2-9]\d{6,7}$'),
+            'id_card': re.compile(r'^[1-9]\d{5}(?:19|20)\d{2}(?:0[1-9]|1[0-2])(?:0[1-9]|[12]\d|3[01])\d{3}[\dXx]$'),
+            'email': re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'),
+            'test_email': re.compile(r'^(test|example|sample)@')
+        }
+    
+    @functools.cached_property
+    def _hyperscan_expressions(self):
+        """
+        各类型可由Hyperscan编译的预筛选表达式，在第一次需要时才逐个试编译
+        
+        各类型的模式以预筛选模式编译，Hyperscan只保证不漏报，因此扫描结果只用于
+        跳过肯定不会匹配的类型，实际的匹配和验证仍由re完成。
+        Hyperscan无法编译的模式不参与预筛选，始终使用re扫描。
+        
+        返回:
+            dict: {类型ID: UTF-8编码的表达式}
+        """
+        expressions = {}
+        for type_id, info in self.patterns.items():
+            # Hyperscan使用PCRE语法，需要将\uXXXX改写为\x{XXXX}
+            expression = re.sub(r'\\u([0-9a-fA-F]{4})', r'\\x{\1}', info['pattern']).encode('utf-8')
+            try:
+                hyperscan.Database().compile(expressions=[expression], flags=[_HYPERSCAN_FLAGS])
+            except hyperscan.error:
+                continue
+            expressions[type_id] = expression
+        return expressions
+    
+    def _hyperscan_prefilter(self, type_key):
+        """
+        获取指定类型组合的Hyperscan预筛选数据库，每种组合只构建一次
+        
+        数据库只包含所选类型的表达式，扫描时不会匹配未选择的类型。
+        只用于获取类型列表或格式化结果的检测器实例不会付出编译数据库的开销
+        
+        参数:
+            type_key (frozenset): 要检测的类型ID集合
+            
+        返回:
+            tuple: (hyperscan.Database或None, 参与预筛选的类型ID列表)
+        """
+        prefilter = self._hyperscan_prefilters.get(type_key)
+        if prefilter is not None:
+            return prefilter
+        
+        expressions = self._hyperscan_expressions
+        type_ids = [type_id for type_id in self.patterns if type_id in type_key and type_id in expressions]
+        
+        database = None
+        if type_ids:
+            database = hyperscan.Database()
+            database.compile(
+                expressions=[expressions[type_id] for type_id in type_ids],
+                ids=list(range(len(type_ids))),
+                elements=len(type_ids),
+                flags=[_HYPERSCAN_FLAGS] * len(type_ids)
+            )
+        
+        prefilter = (database, type_ids)
+        self._hyperscan_prefilters[type_key] = prefilter
+        return prefilter
+    
+    def prepare(self, info_types):
+        """
+        预先构建指定类型组合的预筛选数据库
+        
+        检测时会按需构建，在扫描开始前（如工作进程初始化时）调用可以避免
+        第一个文件的检测付出编译开销。未安装hyperscan时不做任何事
+        
+        参数:
+            info_types (list/set/frozenset): 要检测的敏感信息类型
+        """
+        for type_id in info_types:
+            if type_id not in self.patterns:
+                raise ValueError(f"无效的敏感信息类型ID: {type_id}")
+        
+        if hyperscan is not None:
+            self._hyperscan_prefilter(frozenset(info_types))
+    
+    def _prefilter_skipped_types(self, text, type_ids):
+        """
+        预筛选出文本中肯定不会匹配的类型，避免对其进行完整扫描
+        
+        安装了hyperscan时用所选类型的数据库对文本做一次多模式扫描；否则检查各类型
+        必须包含的内容（数字、@、密码关键词），每项检查只是一次简单搜索
+        
+        参数:
+            text (str): 要检测的文本内容
+            type_ids (list): 要检测的类型ID列表
+            
+        返回:
+            set: 可以跳过的类型ID集合
+        """
+        if hyperscan is not None:
+            type_key = frozenset(type_ids)
+            if self._hyperscan_prefilter(type_key)[0] is not None:
+                try:
+                    return self._hyperscan_skipped_types(text.encode('utf-8'), type_key)
+                except UnicodeEncodeError:
+                    # 无法编码为合法UTF-8的文本改用下面的简单预筛选
+                    pass
+        
+        skipped = set()
+        found = {}
+        for type_id in type_ids:
+            regex = self._required_regex.get(type_id)
+            if regex is None:
+                continue
+            
+            # 多个类型共用同一个检查时只搜索一次
+            if regex not in found:
+                found[regex] = regex.search(text) is not None
+            if not found[regex]:
+                skipped.add(type_id)
+        
+        return skipped
     
-    def _validate_phone(self, match, text):
+    def _hyperscan_skipped_types(self, data, type_key):
+        """
+        使用Hyperscan对文本做一次多模式扫描，找出肯定不会匹配的类型
+        
+        参数:
+            data (bytes): UTF-8编码的文本内容
+            type_key (frozenset): 要检测的类型ID集合
+            
+        返回:
+            set: 可以跳过的类型ID集合
+        """
+        database, type_ids = self._hyperscan_prefilter(type_key)
+        
+        # scratch空间与数据库对应，每个线程为每种类型组合各分配一份
+        scratches = getattr(self._hyperscan_local, 'scratches', None)
+        if scratches is None:
+            scratches = self._hyperscan_local.scratches = {}
+        scratch = scratches.get(type_key)
+        if scratch is None:
+            scratch = scratches[type_key] = hyperscan.Scratch(database)
+        
+        skipped = set(type_ids)
+        
+        def on_match(index, start, end, flags, context):
+            skipped.discard(type_ids[index])
+        
+        database.scan(data, match_event_handler=on_match, scratch=scratch)
+        return skipped
+    
+    def _validate_phone(self, match, context):
         """验证手机号码"""
         phone = match.group()
         
@@ -89,12 +316,11 @@ class SensitiveInfoDetector:
             digits_only = digits_only[2:]
         
         # 检查是否是有效的手机号码格式
-        if not re.match(r'^1[3-9]\d{9}$', digits_only):
+        if not self._format_regex['phone'].match(digits_only):
             return 0
         
         # 检查上下文是否包含手机号相关词汇
-        context = self._get_context_text(text, match.start(), match.end(), 20)
-        if re.search(r'(手机|电话|联系|拨打|号码)', context):
+        if self._context_regex['phone'].search(context):
             return 100
         
         # 检查是否是常见无效号码
@@ -104,33 +330,31 @@ class SensitiveInfoDetector:
         # 基本验证通过
         return 80
     
-    def _validate_landline(self, match, text):
+    def _validate_landline(self, match, context):
         """验证座机号码"""
         landline = match.group()
         
         # 检查是否是有效的座机号码格式
-        if not re.match(r'^(?:0\d{2,3}[-\s])?[2-9]\d{6,7}$', landline):
+        if not self._format_regex['landline'].match(landline):
             return 0
         
         # 检查上下文是否包含座机相关词汇
-        context = self._get_context_text(text, match.start(), match.end(), 20)
-        if re.search(r'(电话|座机|分机|传真|客服)', context):
+        if self._context_regex['landline'].search(context):
             return 100
         
         # 基本验证通过
         return 70
     
-    def _validate_id_card(self, match, text):
+    def _validate_id_card(self, match, context):
         """验证身份证号"""
         id_card = match.group()
         
         # 检查是否是有效的身份证号格式
-        if not re.match(r'^[1-9]\d{5}(?:19|20)\d{2}(?:0[1-9]|1[0-2])(?:0[1-9]|[12]\d|3[01])\d{3}[\dXx]$', id_card):
+        if not self._format_regex['id_card'].match(id_card):
             return 0
         
         # 检查上下文是否包含身份证相关词汇
-        context = self._get_context_text(text, match.start(), match.end(), 20)
-        if re.search(r'(身份证|证件|号码|身份|证号)', context):
+        if self._context_regex['id_card'].search(context):
             return 100
         
         # 检查出生日期是否有效
@@ -145,13 +369,12 @@ class SensitiveInfoDetector:
         # 基本验证通过
         return 90
     
-    def _validate_address(self, match, text):
+    def _validate_address(self, match, context):
         """验证地址"""
         address = match.group()
         
         # 检查上下文是否包含地址相关词汇
-        context = self._get_context_text(text, match.start(), match.end(), 20)
-        if re.search(r'(地址|住址|家庭|位于|住在)', context):
+        if self._context_regex['address'].search(context):
             return 100
         
         # 检查地址长度
@@ -161,69 +384,74 @@ class SensitiveInfoDetector:
         # 基本验证通过
         return 80
     
-    def _validate_email(self, match, text):
+    def _validate_email(self, match, context):
         """验证电子邮箱"""
         email = match.group()
         
         # 检查是否是有效的邮箱格式
-        if not re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', email):
+        if not self._format_regex['email'].match(email):
             return 0
         
         # 检查上下文是否包含邮箱相关词汇
-        context = self._get_context_text(text, match.start(), match.end(), 20)
-        if re.search(r'(邮箱|邮件|电子邮件|Email|联系)', context):
+        if self._context_regex['email'].search(context):
             return 100
         
         # 检查是否是常见的测试邮箱
-        if re.match(r'^(test|example|sample)@', email.lower()):
+        if self._format_regex['test_email'].match(email.lower()):
             return 30
         
         # 基本验证通过
         return 80
     
-    def _validate_password(self, match, text):
+    def _validate_password(self, match, context):
         """验证密码"""
         # 密码在分组中
         password = match.group(1) if match.groups() else match.group()
         
         # 检查上下文是否明确包含密码相关词汇
-        context = self._get_context_text(text, match.start(), match.end(), 20)
-        if re.search(r'(密码|口令|password|pwd)', context):
+        if self._context_regex['password'].search(context):
             return 100
         
         # 基本验证通过
         return 90
     
-    def _validate_credit_card(self, match, text):
+    def _validate_credit_card(self, match, context):
         """验证银行卡号"""
-        card = match.group().replace(' ', '').replace('-', '')
+        # 去掉模式末尾多匹配的一个分隔符（如行尾换行），再去掉数字之间的空格和短横线；
+        # 数字之间残留的换行等其他空白说明这些数字不在同一行，不视为一个卡号
+        card = self._strip_card_separator(match.group()).replace(' ', '').replace('-', '')
         
         # 检查是否是有效的银行卡号格式（16-19位数字）
-        if not re.match(r'^\d{16,19}$', card):
+        if not (16 <= len(card) <= 19 and card.isdecimal()):
             return 0
         
         # 检查上下文是否包含银行卡相关词汇
-        context = self._get_context_text(text, match.start(), match.end(), 20)
-        if re.search(r'(银行卡|信用卡|储蓄卡|卡号|账号)', context):
+        if self._context_regex['credit_card'].search(context):
             return 100
         
         # 使用Luhn算法验证卡号
-        digits = [int(d) for d in card]
-        # 从右向左，对奇数位（从0开始）数字乘以2
-        for i in range(len(digits)-2, -1, -2):
-            digits[i] *= 2
-            # 如果乘以2后大于9，则减去9
-            # (等同于各位数字之和：例如16的各位数字之和为1+6=7，也等于16-9=7)
-            if digits[i] > 9:
-                digits[i] -= 9
-        
-        if sum(digits) % 10 != 0:
+        if not luhn_valid(card):
             return 0
         
         # 基本验证通过
         return 80
     
-    def _validate_ip_address(self, match, text):
+    @staticmethod
+    def _strip_card_separator(value):
+        """
+        去掉银行卡号匹配项末尾的分隔符
+        
+        模式中每组数字后都可以跟一个分隔符，卡号位于行尾时匹配项会带上换行符
+        
+        参数:
+            value (str): 银行卡号的匹配文本
+            
+        返回:
+            str: 去掉末尾空白和短横线后的文本
+        """
+        return value.rstrip().rstrip('-')
+    
+    def _validate_ip_address(self, match, context):
         """验证IP地址"""
         ip = match.group()
         
@@ -237,8 +465,7 @@ class SensitiveInfoDetector:
                 return 0
         
         # 检查上下文是否包含IP相关词汇
-        context = self._get_context_text(text, match.start(), match.end(), 20)
-        if re.search(r'(IP|地址|服务器|网络|主机)', context):
+        if self._context_regex['ip_address'].search(context):
             return 100
         
         # 检查是否是特殊IP
@@ -248,26 +475,6 @@ class SensitiveInfoDetector:
         # 基本验证通过
         return 70
     
-    def _get_context_text(self, text, start, end, context_size=20):
-        """
-        获取匹配项的上下文文本
-        
-        参数:
-            text (str): 原始文本
-            start (int): 匹配项开始位置
-            end (int): 匹配项结束位置
-            context_size (int): 上下文大小（前后各多少字符）
-            
-        返回:
-            str: 上下文文本
-        """
-        # 计算上下文的起始和结束位置
-        context_start = max(0, start - context_size)
-        context_end = min(len(text), end + context_size)
-        
-        # 提取上下文
-        return text[context_start:context_end]
-    
     def get_available_info_types(self):
         """
         获取所有可用的敏感信息类型
@@ -316,10 +523,14 @@ class SensitiveInfoDetector:
         
         参数:
             text (str): 要检测的文本内容
-            info_types (list, optional): 要检测的敏感信息类型列表，如果为None则使用已启用的类型
+            info_types (list/set/frozenset, optional): 要检测的敏感信息类型，如果为None则使用已启用的类型。
+                传入列表时按列表顺序检测；传入集合（如界面每次扫描构建一次的frozenset）时
+                按类型定义的顺序检测，结果中的类型顺序保持稳定
             
         返回:
-            dict: 检测结果，格式为 {类型ID: [匹配项列表]}
+            dict: 检测结果，格式为 {类型ID: 按列存储的匹配项}，每种类型的匹配项按列存放在
+                  'values'、'starts'、'ends'、'confidences'、'contexts' 五个等长序列中，
+                  同一下标对应同一个匹配项，只包含检测到匹配项的类型
         """
         if text is None or text.strip() == "":
             return {}
@@ -333,70 +544,131 @@ class SensitiveInfoDetector:
                 if type_id not in self.patterns:
                     raise ValueError(f"无效的敏感信息类型ID: {type_id}")
         
-        results = defaultdict(list)
+        results = defaultdict(self._new_result_columns)
+        
+        if isinstance(info_types, (set, frozenset)):
+            # 集合没有固定顺序，按类型定义的顺序检测
+            type_ids = [type_id for type_id in self.patterns if type_id in info_types]
+        else:
+            # 去除重复类型，同一类型只扫描一遍文本
+            type_ids = [type_id for type_id in dict.fromkeys(info_types) if type_id in self.patterns]
+        
+        # 预筛选出肯定不会匹配的类型，避免对其进行完整扫描
+        skipped_types = self._prefilter_skipped_types(text, type_ids)
         
         # 对每种类型进行检测
-        for type_id in info_types:
-            if type_id not in self.patterns:
+        for type_id in type_ids:
+            if type_id in skipped_types:
                 continue
                 
-            pattern = self.patterns[type_id]['pattern']
             validator = self.patterns[type_id].get('validator')
             
-            matches = re.finditer(pattern, text, re.IGNORECASE)
+            # 各类型单独扫描：Python的re对单个模式可以使用前缀/字符集快速跳过，
+            # 合并成一个交替模式后这些优化失效，实测整体反而更慢
+            if type_id == 'address' and self._city_automaton is not None:
+                matches = self._iter_address_matches(text)
+            else:
+                matches = self._compiled[type_id].finditer(text)
             
             for match in matches:
+                # 截取匹配项前后各20个字符的上下文，验证器和结果展示共用这一份
+                start, end = match.span()
+                context_start = max(0, start - 20)
+                context_text = text[context_start:end + 20]
+                
                 # 验证匹配项
                 confidence = 100
                 if validator:
-                    confidence = validator(match, text)
+                    confidence = validator(match, context_text)
                 
-                # 如果置信度低于阈值，则跳过
+                # 如果置信度低于阈值，则跳过（此时还未构建展示用的上下文）
                 if confidence < self.confidence_threshold:
                     continue
                 
                 # 对于密码类型，提取分组中的实际密码
                 if type_id == 'password' and match.groups():
-                    password = match.group(1)
-                    results[type_id].append({
-                        'value': password,
-                        'start': match.start(1),
-                        'end': match.end(1),
-                        'context': self._get_context(text, match.start(1), match.end(1)),
-                        'confidence': confidence
-                    })
+                    value_start, value_end = match.span(1)
+                elif type_id == 'credit_card':
+                    # 上报的卡号不包含末尾的分隔符，避免换行符打乱结果展示
+                    value_start = start
+                    value_end = start + len(self._strip_card_separator(match.group()))
                 else:
-                    results[type_id].append({
-                        'value': match.group(),
-                        'start': match.start(),
-                        'end': match.end(),
-                        'context': self._get_context(text, match.start(), match.end()),
-                        'confidence': confidence
-                    })
+                    value_start, value_end = start, end
+                
+                columns = results[type_id]
+                columns['values'].append(text[value_start:value_end])
+                columns['starts'].append(value_start)
+                columns['ends'].append(value_end)
+                columns['confidences'].append(confidence)
+                columns['contexts'].append(self._get_context(context_text, context_start, value_start, value_end))
         
         return dict(results)
     
-    def _get_context(self, text, start, end, context_size=20):
+    def _iter_address_matches(self, text):
+        """
+        借助城市名自动机查找地址，结果与对整个地址模式调用finditer相同
+        
+        地址只可能从城市名处开始，因此先用Aho-Corasick自动机一次扫描找出所有城市名，
+        再只在这些位置上尝试匹配地址模式，而不是在每个字符处尝试几十个城市名
+        
+        参数:
+            text (str): 要检测的文本内容
+            
+        返回:
+            generator: 地址的匹配对象，按位置先后排列且互不重叠
+        """
+        regex = self._compiled['address']
+        starts = sorted({end_index - length + 1 for end_index, length in self._city_automaton.iter(text)})
+        
+        last_end = 0
+        for start in starts:
+            if start < last_end:
+                continue
+            
+            match = regex.match(text, start)
+            if match:
+                last_end = match.end()
+                yield match
+    
+    def _new_result_columns(self):
+        """
+        创建一种类型的空检测结果，匹配项按列存储
+        
+        位置和置信度使用紧凑的数值数组，避免为每个匹配项创建一个字典
+        
+        返回:
+            dict: 包含 values/starts/ends/confidences/contexts 五列的字典
+        """
+        return {
+            'values': [],
+            'starts': array('i'),
+            'ends': array('i'),
+            'confidences': array('B'),
+            'contexts': []
+        }
+    
+    def _get_context(self, context_text, context_start, start, end, context_size=20):
         """
         获取匹配项的上下文
         
         参数:
-            text (str): 原始文本
-            start (int): 匹配项开始位置
-            end (int): 匹配项结束位置
+            context_text (str): 已截取的上下文窗口（匹配项前后各context_size个字符）
+            context_start (int): 上下文窗口在原始文本中的起始位置
+            start (int): 匹配项开始位置（原始文本中的位置）
+            end (int): 匹配项结束位置（原始文本中的位置）
             context_size (int): 上下文大小（前后各多少字符）
             
         返回:
             str: 带有上下文的文本片段
         """
-        # 计算上下文的起始和结束位置
-        context_start = max(0, start - context_size)
-        context_end = min(len(text), end + context_size)
+        # 转换为上下文窗口中的位置
+        start -= context_start
+        end -= context_start
         
         # 提取上下文
-        prefix = text[context_start:start]
-        match = text[start:end]
-        suffix = text[end:context_end]
+        prefix = context_text[max(0, start - context_size):start]
+        match = context_text[start:end]
+        suffix = context_text[end:end + context_size]
         
         return f"{prefix}【{match}】{suffix}"
     
@@ -417,18 +689,20 @@ class SensitiveInfoDetector:
         output.append("检测到以下敏感信息：\n")
         
         for type_id, matches in results.items():
-            if not matches:
+            values = matches['values']
+            if not values:
                 continue
                 
             type_name = self.patterns[type_id]['name']
-            output.append(f"## {type_name}（{len(matches)}项）")
+            output.append(f"## {type_name}（{len(values)}项）")
             
-            for i, match in enumerate(matches, 1):
-                confidence = match.get('confidence', 100)
+            for i, (value, context, confidence) in enumerate(
+                zip(values, matches['contexts'], matches['confidences']), 1
+            ):
                 confidence_str = f"置信度: {confidence}%" if confidence < 100 else ""
                 
-                output.append(f"{i}. 值: {match['value']} {confidence_str}")
-                output.append(f"   上下文: {match['context']}")
+                output.append(f"{i}. 值: {value} {confidence_str}")
+                output.append(f"   上下文: {context}")
                 output.append("")
         
         return "\n".join(output)
@@ -460,3 +734,11 @@ if __name__ == "__main__":
     print("\n仅检测手机号和身份证：")
     results = detector.detect_sensitive_info(test_text, ['phone', 'id_card'])
     print(detector.format_results(results))
+    
+    # 分属不同行的4位数字不能拼成银行卡号
+    results = detector.detect_sensitive_info('年份 账号统计\n2019\n2020\n2021\n2022\n合计', ['credit_card'])
+    assert results == {}, results
+    
+    # 位于行尾的银行卡号不包含换行符
+    results = detector.detect_sensitive_info('卡号：6222000011112222\n户名：张三', ['credit_card'])
+    assert results['credit_card']['values'] == ['6222000011112222'], results
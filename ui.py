@@ -6,15 +6,82 @@
 该模块负责创建图形用户界面，允许用户选择文件和敏感信息类型，并展示扫描结果。
 """
 
+import io
 import os
+import mmap
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
-from image_processor import ImageProcessor
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from image_processor import ImageProcessor, find_image_files
 from sensitive_info_detector import SensitiveInfoDetector
 import threading
-from queue import Queue
-import time
-import gc
+
+# 结果文本中各文件之间的分隔线
+SEP = "\n" + "-" * 50 + "\n\n"
+
+# 保存结果时每次从文本框读取的行数
+_SAVE_CHUNK_LINES = 1000
+
+# 工作进程内的图像处理器和敏感信息检测器，由_worker_init在每个进程中创建一次，
+# 进程内的所有文件共享，避免按文件重复加载OCR引擎和编译模式
+_image_processor = None
+_detector = None
+
+def _worker_init(selected_types):
+    """
+    工作进程初始化函数，创建进程内共享的图像处理器和敏感信息检测器
+    
+    参数:
+        selected_types (frozenset): 本次扫描要检测的敏感信息类型，检测器据此预先构建预筛选数据库
+    """
+    global _image_processor, _detector
+    _image_processor = ImageProcessor()
+    _detector = SensitiveInfoDetector()
+    _detector.prepare(selected_types)
+
+def _read_text(image_processor, file_path):
+    """
+    将文件映射到内存后交给图像处理器识别，解码直接读取系统页缓存，不在进程内另存一份文件内容
+    
+    参数:
+        image_processor (ImageProcessor): 图像处理器
+        file_path (str): 文件路径
+        
+    返回:
+        str: 提取的文本
+    """
+    image_processor.check_image_path(file_path)
+    
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # 空文件无法映射到内存
+            raise IOError(f"无法加载图像: {file_path}, 错误: 文件为空")
+        
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return image_processor.process_image_buffer(mm)
+
+def _scan_one(file_path, selected_types):
+    """
+    扫描单个文件（在工作进程中执行）
+    
+    参数:
+        file_path (str): 文件路径
+        selected_types (frozenset): 要检测的敏感信息类型
+        
+    返回:
+        tuple: (文件路径, 检测结果或处理时发生的异常)
+    """
+    try:
+        # 提取文本
+        text = _read_text(_image_processor, file_path)
+        
+        # 检测敏感信息
+        outcome = _detector.detect_sensitive_info(text, selected_types)
+    except Exception as e:
+        # 异常需要传回主进程，只保留错误信息，确保可以序列化
+        outcome = Exception(str(e))
+    
+    return file_path, outcome
 
 class UI:
     """
@@ -32,18 +99,26 @@ class UI:
         self.root.title("敏感信息扫描工具")
         self.root.geometry("1000x600")
         
-        # 初始化图像处理器和敏感信息检测器
-        self.image_processor = ImageProcessor()
+        # 初始化敏感信息检测器（用于获取类型列表和格式化结果，图像处理和检测在工作进程中完成）
         self.detector = SensitiveInfoDetector()
         
         # 存储敏感信息类型的复选框变量
         self.type_vars = {}
         
+        # 待扫描文件的完整路径，列表框中只显示文件名
+        self._files = []
+        
+        # 渲染扫描结果的文本缓冲区，在多次扫描之间复用
+        self._render_buf = io.StringIO()
+        
         # 创建界面组件
         self.create_widgets()
         
         # 扫描状态
         self.scanning = False
+        
+        # 关闭窗口时先停止扫描，否则进程池会在窗口关闭后继续处理队列中的所有文件
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
     
     def create_widgets(self):
         """创建界面组件"""
@@ -106,10 +181,18 @@ class UI:
             )
             checkbox.pack(anchor=tk.W, padx=5, pady=2)
         
+        # 类型ID和复选框变量的固定列表，开始扫描时直接遍历
+        self._type_items = tuple(self.type_vars.items())
+        
         # 结果显示部分
         result_frame = ttk.LabelFrame(right_frame, text="扫描结果")
         result_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
+        # 扫描进度状态行（扫描过程中只更新这一行，不改写结果文本框）
+        self.status_var = tk.StringVar()
+        self.status_label = ttk.Label(result_frame, textvariable=self.status_var)
+        self.status_label.pack(fill=tk.X, padx=5)
+        
         # 结果文本框
         self.result_text = scrolledtext.ScrolledText(result_frame, wrap=tk.WORD)
         self.result_text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
@@ -126,11 +209,27 @@ class UI:
         self.save_result_button = ttk.Button(self.result_button_frame, text="保存结果", command=self.save_result)
         self.save_result_button.pack(side=tk.LEFT, padx=5, pady=5)
         
+        # 扫描期间需要禁用的按钮
+        self._scan_buttons = (
+            self.scan_button, self.add_file_button, self.add_folder_button,
+            self.clear_list_button, self.clear_result_button, self.save_result_button
+        )
+        
         # 进度条
         self.progress_var = tk.DoubleVar()
         self.progress_bar = ttk.Progressbar(self.result_button_frame, variable=self.progress_var, maximum=100)
         self.progress_bar.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5, pady=5)
     
+    def _set_buttons(self, state):
+        """
+        设置扫描期间需要禁用的所有按钮的状态
+        
+        参数:
+            state (str): 按钮状态（tk.NORMAL或tk.DISABLED）
+        """
+        for button in self._scan_buttons:
+            button.configure(state=state)
+    
     def add_files(self):
         """添加文件到列表"""
         if self.scanning:
@@ -148,8 +247,9 @@ class UI:
         )
         
         if files:
-            for file in files:
-                self.file_listbox.insert(tk.END, file)
+            # 一次插入所有文件，列表框只重绘一次
+            self._files.extend(files)
+            self.file_listbox.insert(tk.END, *(os.path.basename(file) for file in files))
     
     def add_folder(self):
         """添加文件夹中的所有图像文件到列表"""
@@ -160,15 +260,12 @@ class UI:
         folder = filedialog.askdirectory(title="选择文件夹")
         
         if folder:
-            # 支持的图像格式
-            image_extensions = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif')
+            paths = find_image_files(folder)
             
-            # 遍历文件夹中的所有文件
-            for root, _, files in os.walk(folder):
-                for file in files:
-                    if file.lower().endswith(image_extensions):
-                        file_path = os.path.join(root, file)
-                        self.file_listbox.insert(tk.END, file_path)
+            # 一次插入所有文件，列表框只重绘一次
+            if paths:
+                self._files.extend(paths)
+                self.file_listbox.insert(tk.END, *(os.path.basename(path) for path in paths))
     
     def clear_file_list(self):
         """清空文件列表"""
@@ -176,6 +273,7 @@ class UI:
             messagebox.showwarning("警告", "正在扫描中，请等待扫描完成")
             return
             
+        self._files.clear()
         self.file_listbox.delete(0, tk.END)
     
     def clear_result(self):
@@ -192,9 +290,8 @@ class UI:
             messagebox.showwarning("警告", "正在扫描中，请等待扫描完成")
             return
             
-        result_text = self.result_text.get(1.0, tk.END)
-        
-        if not result_text.strip():
+        # 只查找是否存在非空白字符，不读取整个文本
+        if not self.result_text.search(r'\S', 1.0, tk.END, regexp=True):
             messagebox.showwarning("警告", "没有结果可保存")
             return
         
@@ -206,8 +303,11 @@ class UI:
         
         if file_path:
             try:
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(result_text)
+                # 分块读取文本框内容并写入文件，不在内存中构建整个结果文本
+                last_line = int(self.result_text.index('end-1c').split('.')[0])
+                with open(file_path, 'w', encoding='utf-8', buffering=1 << 20) as f:
+                    for line in range(1, last_line + 1, _SAVE_CHUNK_LINES):
+                        f.write(self.result_text.get(f"{line}.0", f"{line + _SAVE_CHUNK_LINES}.0"))
                 messagebox.showinfo("成功", f"结果已保存到: {file_path}")
             except Exception as e:
                 messagebox.showerror("错误", f"保存结果时出错: {str(e)}")
@@ -220,16 +320,13 @@ class UI:
             return
             
         # 获取所选文件
-        files = self.file_listbox.get(0, tk.END)
+        files = self._files
         if not files:
             messagebox.showwarning("警告", "请先添加要扫描的文件")
             return
         
         # 获取所选敏感信息类型
-        selected_types = []
-        for type_id, var in self.type_vars.items():
-            if var.get():
-                selected_types.append(type_id)
+        selected_types = frozenset(type_id for type_id, var in self._type_items if var.get())
         
         if not selected_types:
             messagebox.showwarning("警告", "请至少选择一种敏感信息类型")
@@ -238,185 +335,222 @@ class UI:
         # 清空结果
         self.result_text.delete(1.0, tk.END)
         self.result_text.insert(tk.END, "开始扫描...\n\n")
-        self.root.update()
+        self.result_text.insert(tk.END, "请等待，扫描完成后将显示完整结果...\n")
+        self.status_var.set("")
         
         # 设置扫描状态
         self.scanning = True
         
         # 禁用按钮，防止重复操作
-        self.scan_button.config(state=tk.DISABLED)
-        self.add_file_button.config(state=tk.DISABLED)
-        self.add_folder_button.config(state=tk.DISABLED)
-        self.clear_list_button.config(state=tk.DISABLED)
-        self.clear_result_button.config(state=tk.DISABLED)
-        self.save_result_button.config(state=tk.DISABLED)
+        self._set_buttons(tk.DISABLED)
         
         # 重置进度条
         self.progress_var.set(0)
         
-        # 使用线程池限制并发线程数
-        max_workers = min(10, len(files))  # 最多10个线程或文件数量
-        
         # 添加取消扫描按钮
         self.cancel_button = ttk.Button(self.result_button_frame, text="取消扫描", command=self.stop_scan)
         self.cancel_button.pack(side=tk.LEFT, padx=5, pady=5)
         
-        # 创建结果队列和工作线程
-        result_queue = Queue()
-        total_files = len(files)
-        processed_count = [0]  # 使用列表以便在线程中修改
+        self._total_files = len(files)
+        
+        # 用于保存所有扫描结果的列表，每次扫描新建一个，
+        # 已取消的扫描在之后送达的结果通过列表对象识别并丢弃
+        self._all_results = scan_results = []
         
-        # 用于保存所有扫描结果的列表
-        all_results = []
+        # 使用进程池并行处理文件，进程数不超过CPU核心数和文件数量
+        max_workers = min(os.cpu_count() or 1, len(files))
+        # 工作线程只使用本次扫描的进程池，self.executor可能已被新的扫描替换
+        self.executor = executor = ProcessPoolExecutor(
+            max_workers=max_workers, initializer=_worker_init, initargs=(selected_types,)
+        )
+        future_to_file = {
+            executor.submit(_scan_one, file_path, selected_types): file_path
+            for file_path in files
+        }
         
-        # 进度更新函数
-        def update_progress():
-            while processed_count[0] < total_files and self.scanning:
-                # 更新进度条
-                progress = (processed_count[0] / total_files) * 100
-                self.progress_var.set(progress)
+        # 工作线程函数：按完成顺序收集进程池的结果，通过after_idle交给主线程处理
+        def worker():
+            for i, future in enumerate(as_completed(future_to_file), 1):
+                # 扫描已取消或已被新的扫描替换
+                if not self._is_current_scan(scan_results):
+                    return
                 
-                # 检查队列中是否有结果
-                while not result_queue.empty():
-                    result = result_queue.get()
-                    if result['type'] == 'progress':
-                        self.result_text.delete(1.0, tk.END)
-                        self.result_text.insert(tk.END, f"扫描进度: [{result['index']}/{total_files}]\n")
-                        self.result_text.insert(tk.END, f"正在处理: {os.path.basename(result['file'])}\n\n")
-                        self.result_text.insert(tk.END, "请等待，扫描完成后将显示完整结果...\n")
-                    elif result['type'] == 'error':
-                        # 记录错误但不立即显示
-                        all_results.append({
-                            'is_error': True,
-                            'file': result.get('file', '未知文件'),
-                            'error': result['error']
-                        })
-                    elif result['type'] == 'result':
-                        # 记录结果但不立即显示
-                        all_results.append({
-                            'is_error': False,
-                            'file': result['file'],
-                            'results': result['results']
-                        })
+                file_path = future_to_file[future]
                 
-                self.root.update()
-                time.sleep(0.1)
-            
-            # 所有文件处理完成，显示所有结果
-            if self.scanning:  # 如果不是因为取消而结束
-                self.result_text.delete(1.0, tk.END)
-                self.result_text.insert(tk.END, "扫描完成!\n\n")
+                # 文件名只计算一次，进度、结果和错误信息共用
+                basename = os.path.basename(file_path)
                 
-                # 统计有敏感信息的文件数量
-                files_with_sensitive_info = [r for r in all_results if not r['is_error'] and r['results']]
+                # 更新进度
+                self.root.after_idle(self._handle_progress, scan_results, i, basename)
                 
-                if not files_with_sensitive_info:
-                    self.result_text.insert(tk.END, "未在任何图像中检测到敏感信息。\n")
+                try:
+                    file_path, outcome = future.result()
+                except Exception as e:
+                    # 工作进程异常退出等情况
+                    outcome = e
+                
+                if isinstance(outcome, Exception):
+                    self.root.after_idle(self._handle_error, scan_results, file_path, basename, str(outcome))
                 else:
-                    self.result_text.insert(tk.END, f"在 {len(files_with_sensitive_info)}/{len(all_results)} 个文件中检测到敏感信息：\n\n")
-                    
-                    # 显示所有发现敏感信息的文件
-                    for result in files_with_sensitive_info:
-                        file_path = result['file']
-                        file_results = result['results']
-                        
-                        self.result_text.insert(tk.END, f"文件: {os.path.basename(file_path)}\n")
-                        self.result_text.insert(tk.END, self.detector.format_results(file_results))
-                        self.result_text.insert(tk.END, "\n" + "-"*50 + "\n\n")
-                    
-                    # 显示错误信息
-                    errors = [r for r in all_results if r['is_error']]
-                    if errors:
-                        self.result_text.insert(tk.END, f"\n处理过程中出现 {len(errors)} 个错误：\n\n")
-                        for error in errors:
-                            self.result_text.insert(tk.END, f"文件: {os.path.basename(error['file'])}\n")
-                            self.result_text.insert(tk.END, f"错误: {error['error']}\n\n")
+                    self.root.after_idle(self._handle_result, scan_results, file_path, basename, outcome)
             
-            # 重新启用按钮
-            self.scan_button.config(state=tk.NORMAL)
-            self.add_file_button.config(state=tk.NORMAL)
-            self.add_folder_button.config(state=tk.NORMAL)
-            self.clear_list_button.config(state=tk.NORMAL)
-            self.clear_result_button.config(state=tk.NORMAL)
-            self.save_result_button.config(state=tk.NORMAL)
+            # 所有文件处理完成后关闭进程池并显示结果
+            executor.shutdown(wait=False)
+            self.root.after_idle(self._finish_scan, scan_results)
+        
+        # 启动工作线程，界面更新由工作线程提交给主线程的事件循环执行
+        self.worker_thread = threading.Thread(target=worker, daemon=True)
+        self.worker_thread.start()
+    
+    def _is_current_scan(self, scan_results):
+        """
+        判断回调是否属于正在进行的扫描（扫描被取消后送达的回调不再处理）
+        
+        参数:
+            scan_results (list): 回调所属扫描的结果列表
             
-            # 移除取消按钮
-            if hasattr(self, 'cancel_button'):
-                self.cancel_button.destroy()
+        返回:
+            bool: 是否属于正在进行的扫描
+        """
+        return self.scanning and scan_results is self._all_results
+    
+    def _handle_progress(self, scan_results, index, basename):
+        """
+        更新扫描进度（由工作线程通过after_idle在主线程中调用）
+        
+        参数:
+            scan_results (list): 所属扫描的结果列表
+            index (int): 已完成的文件数
+            basename (str): 文件名
+        """
+        if not self._is_current_scan(scan_results):
+            return
+        
+        self.status_var.set(f"扫描进度: [{index}/{self._total_files}] {basename}")
+        self.progress_var.set((index / self._total_files) * 100)
+    
+    def _handle_error(self, scan_results, file_path, basename, error):
+        """
+        记录处理文件时出现的错误，扫描完成后统一显示（在主线程中调用）
+        
+        参数:
+            scan_results (list): 所属扫描的结果列表
+            file_path (str): 文件路径
+            basename (str): 文件名
+            error (str): 错误信息
+        """
+        if not self._is_current_scan(scan_results):
+            return
+        
+        scan_results.append({
+            'is_error': True,
+            'file': file_path,
+            'basename': basename,
+            'error': error
+        })
+    
+    def _handle_result(self, scan_results, file_path, basename, results):
+        """
+        记录文件的检测结果，扫描完成后统一显示（在主线程中调用）
+        
+        参数:
+            scan_results (list): 所属扫描的结果列表
+            file_path (str): 文件路径
+            basename (str): 文件名
+            results (dict): 检测结果
+        """
+        if not self._is_current_scan(scan_results):
+            return
+        
+        scan_results.append({
+            'is_error': False,
+            'file': file_path,
+            'basename': basename,
+            'results': results
+        })
+    
+    def _finish_scan(self, scan_results):
+        """
+        扫描完成后显示所有结果并恢复界面状态（在主线程中调用）
+        
+        参数:
+            scan_results (list): 所属扫描的结果列表
+        """
+        if not self._is_current_scan(scan_results):
+            # 扫描已取消，由stop_scan恢复界面状态
+            return
+        
+        all_results = scan_results
+        
+        # 所有文件处理完成，显示所有结果
+        self.status_var.set("")
+        
+        # 先在复用的缓冲区中写入全部结果文本，最后一次性插入文本框
+        buf = self._render_buf
+        buf.seek(0)
+        buf.truncate()
+        buf.write("扫描完成!\n\n")
+        
+        # 统计有敏感信息的文件数量
+        files_with_sensitive_info = [r for r in all_results if not r['is_error'] and r['results']]
+        
+        if not files_with_sensitive_info:
+            buf.write("未在任何图像中检测到敏感信息。\n")
+        else:
+            buf.write(f"在 {len(files_with_sensitive_info)}/{len(all_results)} 个文件中检测到敏感信息：\n\n")
             
-            # 重置扫描状态
-            self.scanning = False
+            # 显示所有发现敏感信息的文件
+            for result in files_with_sensitive_info:
+                buf.write(f"文件: {result['basename']}\n")
+                buf.write(self.detector.format_results(result['results']))
+                buf.write(SEP)
             
-            # 进度条设为100%
-            self.progress_var.set(100)
+            # 显示错误信息
+            errors = [r for r in all_results if r['is_error']]
+            if errors:
+                buf.write(f"\n处理过程中出现 {len(errors)} 个错误：\n\n")
+                for error in errors:
+                    buf.write(f"文件: {error['basename']}\n")
+                    buf.write(f"错误: {error['error']}\n\n")
         
-        # 工作线程函数
-        def worker():
-            for i, file_path in enumerate(files, 1):
-                if not self.scanning:
-                    break
-                    
-                # 发送进度更新
-                result_queue.put({
-                    'type': 'progress',
-                    'index': i,
-                    'file': file_path
-                })
-                
-                try:
-                    # 提取文本
-                    text = self.image_processor.process_image(file_path)
-                    
-                    # 检测敏感信息
-                    file_results = self.detector.detect_sensitive_info(text, selected_types)
-                    
-                    # 发送结果
-                    result_queue.put({
-                        'type': 'result',
-                        'file': file_path,
-                        'results': file_results
-                    })
-                except Exception as e:
-                    # 发送错误
-                    result_queue.put({
-                        'type': 'error',
-                        'file': file_path,
-                        'error': str(e)
-                    })
-                
-                # 更新处理计数
-                processed_count[0] += 1
-                
-                # 主动释放内存
-                gc.collect()
+        self.result_text.delete(1.0, tk.END)
+        self.result_text.insert(tk.END, buf.getvalue())
         
-        # 启动工作线程和进度更新线程
-        self.worker_thread = threading.Thread(target=worker, daemon=True)
-        self.progress_thread = threading.Thread(target=update_progress, daemon=True)
+        # 重新启用按钮
+        self._set_buttons(tk.NORMAL)
         
-        self.worker_thread.start()
-        self.progress_thread.start()
+        # 移除取消按钮
+        if hasattr(self, 'cancel_button'):
+            self.cancel_button.destroy()
+        
+        # 重置扫描状态
+        self.scanning = False
+        
+        # 进度条设为100%
+        self.progress_var.set(100)
+    
+    def on_close(self):
+        """关闭窗口，正在扫描时先停止扫描并取消尚未开始的任务"""
+        self.stop_scan()
+        self.root.destroy()
     
     def stop_scan(self):
         """停止扫描"""
         if self.scanning:
             self.scanning = False
             self.result_text.insert(tk.END, "\n扫描已停止!\n")
+            self.status_var.set("")
+            
+            # 取消尚未开始的任务，正在处理的文件完成后工作进程退出
+            if hasattr(self, 'executor'):
+                self.executor.shutdown(wait=False, cancel_futures=True)
             
             # 等待线程完成
             if hasattr(self, 'worker_thread') and self.worker_thread.is_alive():
                 self.worker_thread.join(timeout=1.0)
             
-            if hasattr(self, 'progress_thread') and self.progress_thread.is_alive():
-                self.progress_thread.join(timeout=1.0)
-            
             # 重新启用按钮
-            self.scan_button.config(state=tk.NORMAL)
-            self.add_file_button.config(state=tk.NORMAL)
-            self.add_folder_button.config(state=tk.NORMAL)
-            self.clear_list_button.config(state=tk.NORMAL)
-            self.clear_result_button.config(state=tk.NORMAL)
-            self.save_result_button.config(state=tk.NORMAL)
+            self._set_buttons(tk.NORMAL)
             
             # 移除取消按钮
             if hasattr(self, 'cancel_button'):